@@ -0,0 +1,176 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Cython solver core.
+
+Same algorithm as sudoku.py (work queue reduction, then branch on the cell
+with minimum possibilities) on a uint16_t[81] board of 9-bit masks. The
+whole board fits in 162 bytes, so branching is a memcpy of the board.
+
+Build in place with:
+    cythonize -i solver_c.pyx
+"""
+from libc.stdint cimport uint16_t
+from libc.string cimport memcpy
+
+import sudoku
+
+cdef extern from *:
+    int __builtin_popcount(unsigned int x) nogil
+
+# Bitmask of a cell where all digits [1-9] are possible
+cdef enum:
+    ALL_DIGITS = 0x1FF
+
+# Adjacents tables copied from the pure python solver
+cdef signed char ALL_ADJACENTS[81][20]
+cdef signed char ADJACENTS[81][3][8]
+
+for _cell in range(81):
+    for _k in range(20):
+        ALL_ADJACENTS[_cell][_k] = sudoku.all_adjacents[_cell][_k]
+    for _unit in range(3):
+        for _k in range(8):
+            ADJACENTS[_cell][_unit][_k] = sudoku.adjacents[_cell][_unit][_k]
+
+
+cdef unsigned int eliminate(const uint16_t *board, int cell) nogil:
+    """
+    C version of sudoku.eliminate(). Returns the new mask of the cell or 0 if
+    the board reached an invalid state.
+    """
+    cdef unsigned int possibilities = board[cell]
+    cdef unsigned int value, solved_values = 0, adjacent_values, unique_values
+    cdef int k, unit
+
+    if possibilities & (possibilities - 1) == 0:
+        return possibilities
+
+    for k in range(20):
+        value = board[ALL_ADJACENTS[cell][k]]
+        if value & (value - 1) == 0:
+            solved_values |= value
+
+    possibilities &= ~solved_values
+    if possibilities and possibilities & (possibilities - 1) == 0:
+        return possibilities
+
+    for unit in range(3):
+        adjacent_values = 0
+        for k in range(8):
+            adjacent_values |= board[ADJACENTS[cell][unit][k]]
+
+        unique_values = possibilities & ~adjacent_values
+        if unique_values and unique_values & (unique_values - 1) == 0:
+            return unique_values
+
+        if adjacent_values | possibilities != ALL_DIGITS:
+            return 0
+
+    return possibilities
+
+
+cdef bint reduce_board(uint16_t *board) nogil:
+    """
+    C version of sudoku.reduce_grid() without naked pairs. Cells to visit are
+    kept in a circular work queue. Returns False if the board reached an
+    invalid state.
+    """
+    cdef int queue[81]
+    cdef char in_queue[81]
+    cdef int head = 0, size = 81, cell, k, v
+    cdef unsigned int possibilities, results
+
+    for cell in range(81):
+        queue[cell] = cell
+        in_queue[cell] = 1
+
+    while size:
+        cell = queue[head]
+        head = (head + 1) % 81
+        size -= 1
+        in_queue[cell] = 0
+        possibilities = board[cell]
+
+        if possibilities & (possibilities - 1):
+            results = eliminate(board, cell)
+            if results == 0:
+                return False
+
+            if results != possibilities:
+                board[cell] = <uint16_t>results
+                for k in range(20):
+                    v = ALL_ADJACENTS[cell][k]
+                    if not in_queue[v]:
+                        queue[(head + size) % 81] = v
+                        size += 1
+                        in_queue[v] = 1
+
+    return True
+
+
+cdef bint search(uint16_t *board) nogil:
+    """
+    C version of sudoku.search(). Solves board in place and returns False if
+    there is no solution.
+    """
+    cdef uint16_t child[81]
+    cdef unsigned int remaining, bit
+    cdef int cell, possibilities, min_cell = -1, min_possibilities = 10
+
+    if not reduce_board(board):
+        return False
+
+    for cell in range(81):
+        if board[cell] & (board[cell] - 1):
+            possibilities = __builtin_popcount(board[cell])
+            if possibilities < min_possibilities:
+                min_cell, min_possibilities = cell, possibilities
+                if possibilities == 2:
+                    break
+
+    if min_cell < 0:
+        return True
+
+    # Try possibilities lowest digit first
+    remaining = board[min_cell]
+    while remaining:
+        bit = remaining & -remaining
+        remaining &= ~bit
+
+        memcpy(child, board, sizeof(child))
+        child[min_cell] = <uint16_t>bit
+
+        if search(child):
+            memcpy(board, child, sizeof(child))
+            return True
+
+    return False
+
+
+def solve(puzzle):
+    """
+    Solve sudoku using the C solver core.
+
+    puzzle: 81-character string representing input sudoku
+
+    Returns an 81-character solution for the input sudoku or None if it has
+    no solution.
+    Raises InvalidSudokuError if input is invalid.
+    """
+    cdef uint16_t board[81]
+    cdef bint solved
+    cdef int ndx
+
+    sudoku.validate(puzzle)
+
+    grid = sudoku.str_to_grid(puzzle, fill_possibilities=True)
+    for ndx in range(81):
+        board[ndx] = grid[ndx]
+
+    with nogil:
+        solved = search(board)
+
+    if not solved:
+        return None
+
+    return sudoku.grid_to_str([board[ndx] for ndx in range(81)])
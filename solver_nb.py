@@ -0,0 +1,189 @@
+"""
+Numba-compiled solver core.
+
+Same algorithm as sudoku.py (work queue reduction, then branch on the cell
+with minimum possibilities) but the whole search runs inside a single @njit
+kernel on a uint16[81] array of 9-bit masks. Requires numba and numpy.
+"""
+import numpy as np
+from numba import njit
+
+import sudoku
+
+ALL_DIGITS = sudoku.ALL_DIGITS
+
+# Number of set bits for every 9-bit mask
+POPCNT = np.array([bin(i).count('1') for i in range(512)], dtype=np.int8)
+
+# Adjacents tables shared with the pure python solver
+PEERS_ALL = np.array(sudoku.all_adjacents, dtype=np.int8)
+PEERS_ROW = np.array([a[0] for a in sudoku.adjacents], dtype=np.int8)
+PEERS_COL = np.array([a[1] for a in sudoku.adjacents], dtype=np.int8)
+PEERS_SQ = np.array([a[2] for a in sudoku.adjacents], dtype=np.int8)
+
+
+@njit(cache=True)
+def _unit_values(board, peers, cell):
+    values = 0
+    for k in range(peers.shape[1]):
+        values |= np.int64(board[peers[cell, k]])
+    return values
+
+
+@njit(cache=True)
+def _eliminate(board, cell, peers_all, peers_row, peers_col, peers_sq):
+    """
+    Kernel version of sudoku.eliminate(). Returns the new mask of the cell or
+    0 if the board reached an invalid state.
+    """
+    possibilities = np.int64(board[cell])
+
+    if possibilities & (possibilities - 1) == 0:
+        return possibilities
+
+    solved_values = 0
+    for k in range(peers_all.shape[1]):
+        value = np.int64(board[peers_all[cell, k]])
+        if value & (value - 1) == 0:
+            solved_values |= value
+
+    possibilities &= ~solved_values
+    if possibilities and possibilities & (possibilities - 1) == 0:
+        return possibilities
+
+    for unit in range(3):
+        if unit == 0:
+            adjacent_values = _unit_values(board, peers_row, cell)
+        elif unit == 1:
+            adjacent_values = _unit_values(board, peers_col, cell)
+        else:
+            adjacent_values = _unit_values(board, peers_sq, cell)
+
+        unique_values = possibilities & ~adjacent_values
+        if unique_values and unique_values & (unique_values - 1) == 0:
+            return unique_values
+
+        if adjacent_values | possibilities != ALL_DIGITS:
+            return 0
+
+    return possibilities
+
+
+@njit(cache=True)
+def _reduce(board, peers_all, peers_row, peers_col, peers_sq):
+    """
+    Kernel version of sudoku.reduce_grid() without naked pairs. Cells to
+    visit are kept in a circular work queue. Reduces board in place and
+    returns False if it reached an invalid state.
+    """
+    queue = np.arange(81, dtype=np.int32)
+    in_queue = np.ones(81, dtype=np.bool_)
+    head = 0
+    size = 81
+
+    while size:
+        cell = queue[head]
+        head = (head + 1) % 81
+        size -= 1
+        in_queue[cell] = False
+        possibilities = np.int64(board[cell])
+
+        if possibilities & (possibilities - 1):
+            results = _eliminate(board, cell, peers_all, peers_row,
+                                 peers_col, peers_sq)
+            if results == 0:
+                return False
+
+            if results != possibilities:
+                board[cell] = results
+                for k in range(peers_all.shape[1]):
+                    v = peers_all[cell, k]
+                    if not in_queue[v]:
+                        queue[(head + size) % 81] = v
+                        size += 1
+                        in_queue[v] = True
+
+    return True
+
+
+@njit(cache=True)
+def _min_cell(board):
+    min_cell, min_possibilities = -1, 10
+    for cell in range(81):
+        possibilities = POPCNT[board[cell]]
+        if 1 < possibilities < min_possibilities:
+            min_cell, min_possibilities = cell, possibilities
+    return min_cell
+
+
+@njit(cache=True)
+def solve_nb(mask, peers_all, peers_row, peers_col, peers_sq):
+    """
+    Solve a board of 81 9-bit masks in place using an explicit stack of
+    boards instead of recursion.
+
+    Returns max depth of the search tree, or -1 if there is no solution.
+    """
+    boards = np.empty((82, 81), dtype=np.uint16)
+    cells = np.empty(82, dtype=np.int32)
+    remaining = np.empty(82, dtype=np.int64)
+
+    boards[0, :] = mask
+    if not _reduce(boards[0], peers_all, peers_row, peers_col, peers_sq):
+        return -1
+
+    depth = 0
+    max_depth = 0
+
+    while True:
+        cell = _min_cell(boards[depth])
+        if cell < 0:
+            mask[:] = boards[depth]
+            return max_depth
+
+        cells[depth] = cell
+        remaining[depth] = boards[depth][cell]
+
+        # Try possibilities of the branching cell, lowest digit first, and
+        # backtrack when a level runs out of possibilities
+        while True:
+            if depth < 0:
+                return -1
+
+            rem = remaining[depth]
+            if rem == 0:
+                depth -= 1
+                continue
+
+            bit = rem & -rem
+            remaining[depth] = rem & ~bit
+
+            child = boards[depth+1]
+            child[:] = boards[depth]
+            child[cells[depth]] = bit
+            max_depth = max(max_depth, depth+1)
+
+            if _reduce(child, peers_all, peers_row, peers_col, peers_sq):
+                depth += 1
+                break
+
+
+def solve(sudoku_str):
+    """
+    Solve sudoku using the compiled kernel.
+
+    sudoku_str: 81-character string representing input sudoku
+
+    Returns an 81-character solution for the input sudoku or None if it has
+    no solution.
+    Raises InvalidSudokuError if input is invalid.
+    """
+    sudoku.validate(sudoku_str)
+
+    mask = np.array(sudoku.str_to_grid(sudoku_str, fill_possibilities=True),
+                    dtype=np.uint16)
+
+    if solve_nb(mask, PEERS_ALL, PEERS_ROW, PEERS_COL, PEERS_SQ) < 0:
+        return None
+
+    return sudoku.grid_to_str(mask.tolist())
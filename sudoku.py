@@ -1,11 +1,32 @@
+from __future__ import print_function
+
 import argparse
+import functools
+import itertools
+import multiprocessing
 import random
 import time
+from collections import Counter, deque
+
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
 
-# Max depth of the search tree
-max_depth = 0
+# Bitmask of a cell where all digits [1-9] are possible
+ALL_DIGITS = 0x1FF
 
-adjacents = {}
+# Adjacents of a cell grouped by unit: (row, col, square)
+adjacents = [None] * 81
+# All 20 distinct adjacents of a cell, regardless of unit
+all_adjacents = [None] * 81
+# Cells of every row, col and square as tuples
+rows, cols, squares = [], [], []
+# All 27 units (9 rows, 9 cols and 9 squares)
+units = []
+# Indexes into rows, cols and squares for every cell: (row, col, square)
+cell_units = [None] * 81
 
 
 class InvalidSudokuError(Exception):
@@ -18,28 +39,58 @@ class InvalidSudokuError(Exception):
     pass
 
 
+# popcount(mask) returns the number of possible digits in a cell's bitmask
+try:
+    # Python 3.10+
+    popcount = int.bit_count
+except AttributeError:
+    # Lookup table of set bits for every 9-bit mask
+    _popcounts = bytearray(bin(mask).count('1') for mask in range(512))
+    popcount = _popcounts.__getitem__
+
+# Digit of every solved (single bit) mask. Unsolved masks map to '.'
+_digits = ['.'] * 512
+for _d in range(1, 10):
+    _digits[1 << (_d-1)] = str(_d)
+
+
+def mask_to_digits(mask):
+    """
+    Return the possible digits [1-9] in a cell's bitmask as a sorted list
+    """
+    return [d for d in range(1, 10) if mask & (1 << (d-1))]
+
+
 def str_to_grid(sudoku, fill_possibilities=False):
     """
-    Convert an 81-char string sequence representing sudoku into a grid (dict)
-    with keys as indexes [0-80] and values as possible assignments. Valid
+    Convert an 81-char string sequence representing sudoku into a grid (list
+    of 81 cells) with indexes [0-80] holding possible assignments. Valid
     values are [1-9] for filled cells. All other characters represent an empty
     cell.
+
+    Possible assignments of a cell are stored as a 9-bit mask where bit k is
+    set if digit k+1 is possible. E.g: 0b000000101 means {1, 3}
     """
     if len(sudoku) != 81:
         return None
 
-    possibilities = set(range(1, 10)) if fill_possibilities else set()
+    possibilities = ALL_DIGITS if fill_possibilities else 0
 
-    return {ndx: {int(s)} if s in '123456789' else possibilities
-            for ndx, s in enumerate(sudoku)}
+    return [1 << (int(s)-1) if s in '123456789' else possibilities
+            for s in sudoku]
 
 
 def grid_to_str(grid):
     """
     Convert grid - our internal representation into an 81-char sudoku
-    string
+    string. Unsolved cells are represented by '.'
+
+    Returns None if grid is False, i.e. the sudoku has no solution.
     """
-    return ''.join(str(grid[ndx].pop()) for ndx in range(0, 81))
+    if grid is False:
+        return None
+
+    return ''.join([_digits[mask] for mask in grid])
 
 
 def display(sudoku, header=None):
@@ -47,8 +98,8 @@ def display(sudoku, header=None):
     Return a 'pretty print' sudoku string (2d) with an optional
     header message.
 
-    input: 81 characters of sudoku sequence or a dict with keys [0-80]
-    and possible assignments as values
+    input: 81 characters of sudoku sequence or a grid (list) with possible
+    assignments of cells [0-80]
     """
     grid = str_to_grid(sudoku) if type(sudoku) == str else sudoku
 
@@ -60,7 +111,7 @@ def display(sudoku, header=None):
     # Space added between cells for pretty printing
     space_btwn_cells = 2
 
-    max_possibilities = max([len(v) for v in grid.values()])
+    max_possibilities = max([popcount(v) for v in grid])
 
     for ndx in range(0, 81):
         possibilities = grid[ndx]
@@ -77,14 +128,14 @@ def display(sudoku, header=None):
             result += ' | '
 
         # Print . in place of empty cells
-        cell_content = ''.join(str(s) for s in sorted(possibilities)) \
-            if len(possibilities) > 0 else '.'
+        cell_content = ''.join(str(s) for s in mask_to_digits(possibilities)) \
+            if possibilities else '.'
 
         cell_padding = max_possibilities - len(cell_content)
         # Note ONE pre and post whitespace when forming contents of a cell
         result += ' ' + cell_content + ' '*cell_padding + ' '
 
-    #print result + '\n'
+    #print(result + '\n')
     result += '\n'
     return result
 
@@ -94,7 +145,7 @@ def get_square_indices(row, col):
     Given row and col of a cell, find all adjacent cells in its square.
     Return a list of zero-based indices
     """
-    sq_row, sq_col = row/3, col/3
+    sq_row, sq_col = row//3, col//3
     # Identify the start location of square index in the grid
     sq_start_ndx = (sq_row*9*3) + (sq_col*3)
     sq_indices = [sq_start_ndx+c for c in [0, 1, 2, 9, 10, 11, 18, 19, 20]]
@@ -115,12 +166,20 @@ def is_solved(sudoku):
     return sudoku.isdigit()
 
 
+def count_in_unit(sudoku, unit, s):
+    """
+    Return how many times character s appears in the cells of a unit (a row,
+    col or square) of an 81-char sudoku string
+    """
+    return sum(1 for x in unit if sudoku[x] == s)
+
+
 def validate(sudoku):
     """
     Returns True if input 81-char sudoku string is valid (like no repeating
     chars in any row), raises InvalidSudokuError otherwise.
     """
-    if sudoku is None or not isinstance(sudoku, basestring):
+    if sudoku is None or not isinstance(sudoku, str):
         raise InvalidSudokuError('Input must be an 81-character string')
 
     # Ensure input string is always 81 characters
@@ -130,35 +189,34 @@ def validate(sudoku):
 
     # Ensure that initially assigned values do not have conflict.
     # E.g: repeating number in a row, col, square
+    # Digits seen so far in every row, col and square are kept as 9-bit masks
+    row_masks, col_masks, sq_masks = [0]*9, [0]*9, [0]*9
+
     for ndx, s in enumerate(sudoku):
         # Initially assigned cell
         if s in '123456789':
-            row, col = int(ndx/9), ndx % 9
-            row_occurrences = [l for l, su in enumerate(sudoku[row*9:row*9+9])
-                               if s == su]
+            bit = 1 << (int(s)-1)
+            row, col, sq = cell_units[ndx]
 
-            if len(row_occurrences) > 1:
+            # Occurrences are only counted to report the conflict
+            if row_masks[row] & bit:
+                count = count_in_unit(sudoku, rows[row], s)
                 raise InvalidSudokuError('{0} appears {1}x in row {2}'.
-                                         format(
-                                             s, len(row_occurrences), row+1
-                                         ))
-
-            col_occurrences = [l for l, su in enumerate(sudoku[col::9])
-                               if s == su]
+                                         format(s, count, row+1))
 
-            if len(col_occurrences) > 1:
+            if col_masks[col] & bit:
+                count = count_in_unit(sudoku, cols[col], s)
                 raise InvalidSudokuError('{0} appears {1}x in col {2}'.
-                                         format(
-                                             s, len(col_occurrences), col+1))
+                                         format(s, count, col+1))
 
-            sq_indices = get_square_indices(row, col)
-            sq_occurrences = [l for l, su in enumerate(
-                ''.join(sudoku[x] for x in sq_indices)
-                ) if s == su]
-
-            if len(sq_occurrences) > 1:
+            if sq_masks[sq] & bit:
+                count = count_in_unit(sudoku, squares[sq], s)
                 raise InvalidSudokuError('{0} appears {1}x in a square'.
-                                         format(s, len(sq_occurrences)))
+                                         format(s, count))
+
+            row_masks[row] |= bit
+            col_masks[col] |= bit
+            sq_masks[sq] |= bit
     return True
 
 
@@ -178,145 +236,454 @@ def eliminate(grid, cell):
     cell: Cell to remove possible digits from. This is the index in the grid
             in the range[0-80]
 
-    Returns the new possible digits for the cell as a set or False if
+    Returns the new possible digits for the cell as a bitmask or 0 if
         sudoku reaches an invalid state
     """
     possibilities = grid[cell]
 
-    if len(possibilities) == 1:
+    if possibilities & (possibilities - 1) == 0:
         # This cell is solved
         return possibilities
 
-    # Find all adjacents of this cell (all cells in this cell's row,
-    # col and square)
-    cell_adjacents = adjacents[cell][0] + adjacents[cell][1] + adjacents[cell][2]
     # Get all 'solved' digits from this cell's row, col and sq
-    solved_adjacents_values = [grid[v] for v in cell_adjacents
-                               if len(grid[v]) == 1]
+    solved_adjacents_values = 0
+    for v in all_adjacents[cell]:
+        value = grid[v]
+        if value & (value - 1) == 0:
+            solved_adjacents_values |= value
 
     if solved_adjacents_values:
-        new_possibilities = possibilities - set.union(*solved_adjacents_values)
+        new_possibilities = possibilities & ~solved_adjacents_values
 
-        if len(new_possibilities) == 1:
+        if new_possibilities and new_possibilities & (new_possibilities - 1) == 0:
             return new_possibilities
         else:
             possibilities = new_possibilities
 
     # Find if we have a unique value left in this cell by subtracting this
     # cell's possible values from all values in row or column or square
-    # 0: row, 1: col, 2: square
-    for uniqueness in [0, 1, 2]:
-        adjacent_values = set.union(*[grid[v] for v in adjacents[cell][uniqueness]])
-        unique_values = possibilities - adjacent_values
-
-        if len(unique_values) == 1:
+    # one at a time
+    for unit_adjacents in adjacents[cell]:
+        adjacent_values = 0
+        for v in unit_adjacents:
+            adjacent_values |= grid[v]
+        unique_values = possibilities & ~adjacent_values
+
+        if unique_values and unique_values & (unique_values - 1) == 0:
             return unique_values
 
         # Did our reduction lead to an invalid state?
-        if {1, 2, 3, 4, 5, 6, 7, 8, 9} != adjacent_values | possibilities:
-            return False
+        if adjacent_values | possibilities != ALL_DIGITS:
+            return 0
 
     return possibilities
 
 
+def eliminate_naked_pairs(grid, unit):
+    """
+    Find naked pairs in a unit: two cells with the same two possible digits.
+    E.g: Cells 3 and 7 of a row both have '26'. Then 2 and 6 must go in these
+    two cells, so remove them from all other cells of the unit.
+
+    Returns a list of cells whose possible digits were reduced or False if
+    sudoku reaches an invalid state (e.g: three cells sharing two digits or
+    a removal solving a cell with the digit of a solved adjacent)
+    """
+    pairs = {}
+    for cell in unit:
+        possibilities = grid[cell]
+        if possibilities & (possibilities - 1) and popcount(possibilities) == 2:
+            pairs[possibilities] = pairs.get(possibilities, 0) + 1
+
+    reduced_cells = []
+    for pair, count in pairs.items():
+        if count < 2:
+            continue
+
+        if count > 2:
+            return False
+
+        for cell in unit:
+            possibilities = grid[cell]
+            if possibilities != pair and possibilities & pair:
+                possibilities &= ~pair
+                if not possibilities:
+                    return False
+
+                if possibilities & (possibilities - 1) == 0:
+                    # This cell is solved. Its digit must not be taken by a
+                    # solved adjacent, including cells solved earlier in this
+                    # pass since they share the unit
+                    for v in all_adjacents[cell]:
+                        if grid[v] == possibilities:
+                            return False
+
+                grid[cell] = possibilities
+                reduced_cells.append(cell)
+
+    return reduced_cells
+
+
+def make_clue_eliminator(clues):
+    """
+    Return a function which removes the digits of clues from possibilities
+    of their adjacents, specialized for one set of clue positions.
+
+    Puzzle collections often share the positions of their clues. The
+    function is generated as straight-line code for every empty cell with
+    clue adjacents. Cells left with no possibilities are not changed, so
+    reduction still finds them invalid.
+
+    clues: Sorted tuple of indexes [0-80] of clues
+    """
+    clue_cells = set(clues)
+    source = ['def eliminate_clues(grid):']
+
+    for cell in range(0, 81):
+        clue_adjacents = [v for v in all_adjacents[cell] if v in clue_cells]
+        if cell in clue_cells or not clue_adjacents:
+            continue
+
+        source.append('    possibilities = {0} & ~({1})'.format(
+            ALL_DIGITS,
+            ' | '.join('grid[{0}]'.format(v) for v in clue_adjacents)))
+        source.append('    if possibilities:')
+        source.append('        grid[{0}] = possibilities'.format(cell))
+
+    source.append('    return grid')
+
+    namespace = {}
+    exec(compile('\n'.join(source), '<eliminate_clues>', 'exec'), namespace)
+    return namespace['eliminate_clues']
+
+
 def reduce_grid(grid):
     """
     Iterate through all cells in the grid and eliminate possibilities to create
     a reduced grid
 
+    Cells to visit are kept in a work queue. When a cell's possibilities are
+    reduced, only its adjacents are queued again since they are the only
+    cells whose elimination depends on it. Once the queue is empty, naked
+    pairs are eliminated from every unit and the reduced cells are queued
+    again.
+
     Returns a reduced grid if elimination was successful.
     Returns False if elimination leads to an invalid state (e.g: invalid
     assignment)
     """
-    cell = 0
-
-    while cell < 81:
-        n = len(grid[cell])
-
-        if n > 1:
-            results = eliminate(grid, cell)
-            # Invalid state! Do not assign and return FALSE
-            if not results:
+    queue = deque(range(0, 81))
+    in_queue = bytearray(b'\x01' * 81)
+
+    while queue:
+        while queue:
+            cell = queue.popleft()
+            in_queue[cell] = 0
+            possibilities = grid[cell]
+
+            if possibilities & (possibilities - 1):
+                results = eliminate(grid, cell)
+                # Invalid state! Do not assign and return FALSE
+                if results == 0:
+                    return False
+
+                if results != possibilities:
+                    # We reduce possible values for this cell. Revisit
+                    # adjacents
+                    grid[cell] = results
+                    for v in all_adjacents[cell]:
+                        if not in_queue[v]:
+                            queue.append(v)
+                            in_queue[v] = 1
+
+        for unit in units:
+            reduced_cells = eliminate_naked_pairs(grid, unit)
+            if reduced_cells is False:
                 return False
 
-            if len(results) < n:
-                # We reduce possible values for this cell. Restart reduction
-                grid[cell] = results
-                cell = 0
-                continue
-
-        cell += 1
+            for cell in reduced_cells:
+                for v in (cell,) + all_adjacents[cell]:
+                    if not in_queue[v]:
+                        queue.append(v)
+                        in_queue[v] = 1
 
     return grid
 
 
-def search(grid, randomize_traversal, depth=0):
+class Solver(object):
+    """
+    Backtracking sudoku solver which keeps statistics of its last solve.
 
-    # Track max depth we hit using this approach
-    global max_depth
-    max_depth = max(max_depth, depth)
+    randomize_traversal: Randomize tree traversal when solving
+    rng: Random generator used to shuffle possibilities when traversal is
+        randomized
+    stop: Optional event polled while searching. Once it is set, the search
+        gives up and returns no solution
+    """
 
-    if max_depth > 81:
-        # In the worst case, we would have tried 81 possible assignments in a
-        # given branch. Curious to find a sudoku, which leads to this.
-        print 'Max depth of {0} reached. Returning..'.format(max_depth)
-        return False
+    def __init__(self, randomize_traversal=False, rng=random, stop=None):
+        self.randomize_traversal = randomize_traversal
+        self.rng = rng
+        self.stop = stop
+        # Max depth of the search tree
+        self.max_depth = 0
+
+    def search(self, grid):
+        """
+        Depth-first search for a solution, starting from grid.
+
+        Instead of recursing, the search keeps an explicit stack of frames.
+        Each frame is (grid, depth, cell to branch on, possibilities left to
+        try). A frame's cell is None until its grid is reduced.
+
+        Returns the solved grid or False if there is no solution.
+        """
+        # Track max depth we hit using this approach. Kept local while
+        # searching and stored on the solver when done
+        max_depth = 0
+        stack = [(grid, 0, None, None)]
+
+        while stack:
+            grid, depth, min_cell, possibilities = stack[-1]
+
+            if min_cell is None:
+                if self.stop is not None and self.stop.is_set():
+                    break
+
+                if depth > max_depth:
+                    max_depth = depth
+
+                if max_depth > 81:
+                    # In the worst case, we would have tried 81 possible
+                    # assignments in a given branch. Curious to find a
+                    # sudoku, which leads to this.
+                    print('Max depth of {0} reached. Returning..'.format(
+                        max_depth))
+                    self.max_depth = max_depth
+                    return False
+
+                # Start with reduction
+                if not reduce_grid(grid):
+                    stack.pop()
+                    continue
+
+                # Pick the cell with minimum possibilities. Pick first
+                # possibility and solve it. If it doesn't work, backtrack and
+                # pick the next possibility
+                min_possibilities = 10
+
+                for cell in range(0, 81):
+                    mask = grid[cell]
+                    if mask & (mask - 1):
+                        count = popcount(mask)
+                        if count < min_possibilities:
+                            min_cell, min_possibilities = cell, count
+                            if count == 2:
+                                # No unsolved cell can have fewer
+                                # possibilities
+                                break
+
+                if min_cell is None:
+                    self.max_depth = max_depth
+                    return grid
+
+                possibilities = mask_to_digits(grid[min_cell])
+
+                if self.randomize_traversal:
+                    self.rng.shuffle(possibilities)
+
+                # Possibilities are popped from the end, so reverse them to
+                # try them in order
+                possibilities.reverse()
+                stack[-1] = (grid, depth, min_cell, possibilities)
+
+            p = possibilities.pop()
+
+            if possibilities:
+                recurse_grid = grid[:]
+            else:
+                # grid is never revisited after the last possibility, so
+                # assign it in place instead of copying
+                stack.pop()
+                recurse_grid = grid
 
-    # Start with reduction
-    result = reduce_grid(grid)
-    if not result:
-        return False
+            recurse_grid[min_cell] = 1 << (p-1)
+            stack.append((recurse_grid, depth+1, None, None))
 
-    grid = result
+        self.max_depth = max_depth
+        return False
 
-    # Pick the cell with minimum possibilities. Pick first possibility and
-    # solve it. If it doesn't work, backtrack and pick the next possibility
-    # min_ndx = min( ((k,v) for k,v in grid.items() if len(v) > 1), \
-    #                key=lambda x: len(x[1]) )[0]
-    min_cell = None
+    def solve(self, sudoku, eliminate_clues=None):
+        """
+        Solve sudoku!
 
-    for cell in range(0, 81):
-        possibilities = len(grid[cell])
-        if possibilities > 1:
-            if not min_cell or possibilities < len(grid[min_cell]):
-                min_cell = cell
+        sudoku: 81-character string representing input sudoku
+        eliminate_clues: Optional function from make_clue_eliminator() for
+            the clue positions of sudoku, run before searching
 
-    if not min_cell:
-        return grid
+        Returns an 81-character solution for the input sudoku or None if it
+        has no solution.
+        Raises InvalidSudokuError if input is invalid.
+        """
+        validate(sudoku)
 
-    # Pick one of the possibilities of min ndx and ensure we don't create an
-    # invalid state by assigning this value.
-    possibilities = list(grid[min_cell])
+        grid = str_to_grid(sudoku, fill_possibilities=True)
 
-    if randomize_traversal:
-        random.shuffle(possibilities)
+        if eliminate_clues:
+            eliminate_clues(grid)
 
-    for p in possibilities:
-        recurse_grid = grid.copy()
-        recurse_grid[min_cell] = {p}
+        return grid_to_str(self.search(grid))
 
-        results = search(recurse_grid, randomize_traversal, depth+1)
+    def solve_timed(self, sudoku, eliminate_clues=None):
+        """
+        Solve sudoku and collect solver's statistics.
 
-        if results:
-            # If we reach here, we have a successful assignment
-            return results
+        Returns a tuple of (solution, computation time in seconds, max depth
+        of the search tree)
+        """
+        start = time.time()
+        solution = self.solve(sudoku, eliminate_clues)
+        end = time.time()
 
-    return False
+        return solution, end-start, self.max_depth
 
 
-def solve(sudoku, randomize_traversal=False):
+def solve(sudoku, randomize_traversal=False, rng=random):
     """
     Solve sudoku!
 
     sudoku: 81-character string representing input sudoku
+    rng: Random generator used to shuffle possibilities when traversal is
+        randomized
 
-    Returns an 81-character solution for the input sudoku.
+    Returns an 81-character solution for the input sudoku or None if it has
+    no solution.
+    Raises InvalidSudokuError if input is invalid.
+    """
+    return Solver(randomize_traversal, rng).solve(sudoku)
+
+
+def solve_timed(sudoku, randomize_traversal=False, rng=random):
+    """
+    Solve sudoku and collect solver's statistics. Every call uses its own
+    Solver.
+
+    Returns a tuple of (solution, computation time in seconds, max depth of
+    the search tree)
+    """
+    return Solver(randomize_traversal, rng).solve_timed(sudoku)
+
+
+def solve_timed_all(sudokus, randomize_traversal=False):
+    """
+    Solve a list of sudokus one after another and collect solver's
+    statistics for each.
+
+    Sudokus whose clue positions appear more than once in the list share a
+    clue eliminator generated for those positions. Generating one for
+    positions seen only once costs more than it saves.
+
+    Yields a tuple of (solution, computation time in seconds, max depth of
+    the search tree) for every sudoku
+    """
+    clues = [tuple(ndx for ndx, s in enumerate(sudoku) if s in '123456789')
+             for sudoku in sudokus]
+    # Sudokus left to solve for every set of clue positions
+    remaining = Counter(clues)
+    eliminators = {}
+    solver = Solver(randomize_traversal)
+
+    for sudoku, positions in zip(sudokus, clues):
+        remaining[positions] -= 1
+
+        eliminate_clues = eliminators.get(positions)
+        if eliminate_clues is None and remaining[positions]:
+            eliminate_clues = make_clue_eliminator(positions)
+            eliminators[positions] = eliminate_clues
+        if not remaining[positions]:
+            # Last sudoku with these positions
+            eliminators.pop(positions, None)
+
+        yield solver.solve_timed(sudoku, eliminate_clues)
+
+
+def _solve_timed_chunk(sudokus, randomize_traversal):
+    return list(solve_timed_all(sudokus, randomize_traversal))
+
+
+def _race_worker(sudoku, seed, stop, results):
+    # Report the result, or the exception raised, of one randomized traversal
+    solver = Solver(True, random.Random(seed), stop)
+    try:
+        result = solver.solve_timed(sudoku)
+    except Exception as e:
+        result = e
+    results.put(result)
+
+
+def solve_race(sudoku, k=None):
+    """
+    Solve sudoku by racing k randomized traversals in worker processes and
+    keep the first one to finish. For very hard puzzles, a bad pick of early
+    branches can dominate the computation time.
+
+    k: Number of worker processes. Defaults to number of CPUs
+
+    Returns a tuple of (solution, computation time in seconds, max depth of
+    the search tree of the winning traversal)
     Raises InvalidSudokuError if input is invalid.
     """
     validate(sudoku)
 
-    grid = str_to_grid(sudoku, fill_possibilities=True)
-    return grid_to_str(search(grid, randomize_traversal=randomize_traversal))
+    k = k or multiprocessing.cpu_count()
+    # Every worker shuffles possibilities with its own seed
+    seeds = [random.getrandbits(32) for _ in range(k)]
+
+    # Workers are not terminated, since killing one while it writes to the
+    # results queue would leave the queue locked. They poll stop instead
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_race_worker,
+                                       args=(sudoku, seed, stop, results))
+               for seed in seeds]
+
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    try:
+        result = None
+        while result is None:
+            # Check workers before waiting, so a result reported right
+            # before exiting is still read
+            alive = any(worker.is_alive() for worker in workers)
+            try:
+                result = results.get(timeout=0.1)
+            except queue.Empty:
+                if not alive:
+                    raise RuntimeError('Race workers exited without a result')
+    finally:
+        # Stop traversals which are still running
+        stop.set()
+        for worker in workers:
+            worker.join()
+    end = time.time()
+
+    if isinstance(result, Exception):
+        raise result
+    solution, _, depth = result
+
+    return solution, end-start, depth
+
+
+def positive_int(value):
+    """
+    argparse type for options which need a number greater than zero
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            '{0} is not a positive number'.format(value))
+    return number
 
 
 # Initialize and identify adjacents for all cells
@@ -326,7 +693,19 @@ for row in range(0, 9):
         cells_in_col = [x for x in range(col, 81, 9) if x != (row*9+col)]
         cells_in_sq = get_square_indices(row, col)
         cells_in_sq.remove(row*9+col)
-        adjacents[row*9+col] = [cells_in_row, cells_in_col, cells_in_sq]
+        adjacents[row*9+col] = (tuple(cells_in_row), tuple(cells_in_col),
+                                tuple(cells_in_sq))
+        all_adjacents[row*9+col] = tuple(
+            sorted(set(cells_in_row) | set(cells_in_col) | set(cells_in_sq)))
+
+rows.extend(tuple(range(row*9, row*9+9)) for row in range(0, 9))
+cols.extend(tuple(range(col, 81, 9)) for col in range(0, 9))
+squares.extend(tuple(get_square_indices(row, col))
+               for row in range(0, 9, 3) for col in range(0, 9, 3))
+units.extend(rows + cols + squares)
+
+for ndx in range(0, 81):
+    cell_units[ndx] = (ndx // 9, ndx % 9, (ndx // 27)*3 + (ndx % 9)//3)
 
 if __name__ == '__main__':
 
@@ -357,6 +736,13 @@ if __name__ == '__main__':
 
     parser.add_argument('-r', '--randomize', action='store_true',
                         help='Randomize tree traversal when solving. For fun!')
+    parser.add_argument('-R', '--race', action='store_true',
+                        help='Race randomized tree traversals of each puzzle \
+                              in worker processes and keep the fastest')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=None,
+                        help='Number of worker processes solving puzzles of \
+                              an input file, or racing with -R. Defaults to \
+                              number of CPUs')
 
     args = parser.parse_args()
 
@@ -365,44 +751,74 @@ if __name__ == '__main__':
     if args.puzzle:
         puzzles.append(args.puzzle)
     else:
-        with open(args.input, 'rb') as sudoku_input:
+        with open(args.input, 'r') as sudoku_input:
             puzzles = sudoku_input.readlines()
 
-    header_printed = False
-
-    for ndx, sudoku in enumerate(puzzles):
-        sudoku = sudoku.strip()
-
-        if sudoku.startswith('#'):
-            continue
+    # Skip comments but keep line numbers for display
+    puzzles = [(ndx, sudoku.strip()) for ndx, sudoku in enumerate(puzzles)
+               if not sudoku.strip().startswith('#')]
+
+    sudokus = [sudoku for _, sudoku in puzzles]
+    jobs = args.jobs or multiprocessing.cpu_count()
+    pool = None
+
+    if args.race:
+        # Workers race on one puzzle at a time
+        results = (solve_race(sudoku, args.jobs) for _, sudoku in puzzles)
+    elif jobs > 1 and len(puzzles) > 1:
+        # Solve puzzles in parallel, a few chunks per worker process.
+        # imap() keeps results in input order
+        pool = multiprocessing.Pool(jobs)
+        size = len(sudokus) // (jobs * 4) + 1
+        chunks = [sudokus[i:i+size] for i in range(0, len(sudokus), size)]
+        results = itertools.chain.from_iterable(pool.imap(
+            functools.partial(_solve_timed_chunk,
+                              randomize_traversal=args.randomize), chunks))
+    else:
+        results = solve_timed_all(sudokus, args.randomize)
 
-        start = time.time()
-        solution = solve(sudoku, args.randomize)
-        end = time.time()
+    header_printed = False
 
-        if is_solved(solution):
-            # We have a solution. Decide how to display solution
-            if args.prettyprint:
-                print display(sudoku, "Input #" + str(ndx+1))
-                print display(solution, "Solution")
-            elif args.dfprint:
-                if not header_printed:
-                    print 'Sudoku,Solution,Computation_Time(s),Max_Search_Depth'
-                    header_printed = True
-
-                print '{0},{1},{2:.3f},{3}'.format(sudoku, solution,
-                                                   end-start, max_depth)
+    try:
+        for ndx, sudoku in puzzles:
+            solution, elapsed, depth = next(results)
+
+            if solution and is_solved(solution):
+                # We have a solution. Decide how to display solution
+                if args.prettyprint:
+                    print(display(sudoku, "Input #" + str(ndx+1)))
+                    print(display(solution, "Solution"))
+                elif args.dfprint:
+                    if not header_printed:
+                        print('Sudoku,Solution,Computation_Time(s),Max_Search_Depth')
+                        header_printed = True
+
+                    print('{0},{1},{2:.3f},{3}'.format(sudoku, solution,
+                                                       elapsed, depth))
+                else:
+                    print(sudoku)
+                    print('>', solution)
+                if not args.dfprint and not args.nostat:
+                    print('>>Solved in {0:.3f}s with max depth {1}'
+                          .format(elapsed, depth))
+            elif not solution:
+                if args.prettyprint:
+                    print(display(sudoku, "Input #" + str(ndx+1)))
+                elif args.dfprint:
+                    # Keep the row with an empty solution
+                    if not header_printed:
+                        print('Sudoku,Solution,Computation_Time(s),Max_Search_Depth')
+                        header_printed = True
+
+                    print('{0},,{1:.3f},{2}'.format(sudoku, elapsed, depth))
+                else:
+                    print(sudoku)
+                if not args.dfprint:
+                    print('\tNo solution for this puzzle')
             else:
-                print sudoku
-                print '>', solution
-            if not args.dfprint and not args.nostat:
-                print '>>Solved in {0:.3f}s with max depth {1}' \
-                      .format(end-start, max_depth)
-            max_depth = 0
-        elif not solution:
-            if args.prettyprint:
-                print display(sudoku)
-        else:
-            # Will we ever reach here?
-            print '\tHmm...Can\'t solve this puzzle'
-            print display(solution, 'Unsolved state')
+                # Will we ever reach here?
+                print('\tHmm...Can\'t solve this puzzle')
+                print(display(solution, 'Unsolved state'))
+    finally:
+        if pool:
+            pool.terminate()
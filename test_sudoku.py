@@ -2,27 +2,46 @@ import unittest
 import sudoku
 from sudoku import InvalidSudokuError
 
-class SudokuTest(unittest.TestCase):
+try:
+    import solver_nb
+except ImportError:
+    solver_nb = None
+
+try:
+    import solver_c
+except ImportError:
+    solver_c = None
+
+def digits_mask(digits):
+    # Bitmask of a cell where only digits are possible
+    return sum(1 << (int(d)-1) for d in digits)
+
+class SudokuTestCase(unittest.TestCase):
+    # Python 2 only has the old name, which Python 3.12 removed
+    if not hasattr(unittest.TestCase, 'assertRaisesRegex'):
+        assertRaisesRegex = unittest.TestCase.assertRaisesRegexp
+
+class SudokuTest(SudokuTestCase):
 
     def test_empty_str(self):
         self.assertRaises(InvalidSudokuError, sudoku.solve, '')
-        self.assertRaisesRegexp(InvalidSudokuError, 'Input length is .* 81 characters',\
+        self.assertRaisesRegex(InvalidSudokuError, 'Input length is .* 81 characters',\
                                 sudoku.solve, '')
 
     def test_is_str(self):
-        self.assertRaisesRegexp(InvalidSudokuError, 'Input must be .*81-character string', sudoku.solve, 1)
+        self.assertRaisesRegex(InvalidSudokuError, 'Input must be .*81-character string', sudoku.solve, 1)
 
     def test_none_input(self):
-        self.assertRaisesRegexp(InvalidSudokuError, 'Input must be .*81-character string', sudoku.solve, None)
+        self.assertRaisesRegex(InvalidSudokuError, 'Input must be .*81-character string', sudoku.solve, None)
     
     def test_less_81_char(self):
         bad_input  = '.1...8...3.472169...6....1....9.253..421.378..358.6....9....1...213874.9...5...2'
-        self.assertRaisesRegexp(InvalidSudokuError, 'Input length is 80.*81 characters',\
+        self.assertRaisesRegex(InvalidSudokuError, 'Input length is 80.*81 characters',\
                                 sudoku.solve, bad_input)
         
     def test_more_81_char(self):
         bad_input  = '.1...8...3.472169...6....1....9.253..421.378..358.6....9....1...213874.9...5...2..'
-        self.assertRaisesRegexp(InvalidSudokuError, 'Input length is 82.*81 characters',\
+        self.assertRaisesRegex(InvalidSudokuError, 'Input length is 82.*81 characters',\
                                 sudoku.solve, bad_input)
 
     def test_eq_81_char(self):
@@ -30,6 +49,105 @@ class SudokuTest(unittest.TestCase):
         expected_sol = '719638254354721698286495317678942531942153786135876942893264175521387469467519823'
         self.assertEqual(expected_sol, sudoku.solve(good_input))
 
+    def test_grid_to_str(self):
+        good_input = '.1...8...3.472169...6....1....9.253..421.378..358.6....9....1...213874.9...5...2.'
+        grid = sudoku.str_to_grid(good_input, fill_possibilities=True)
+        self.assertEqual(good_input, sudoku.grid_to_str(grid))
+        # Converting must not change the grid
+        self.assertEqual(good_input, sudoku.grid_to_str(grid))
+
+    def test_grid_to_str_no_solution(self):
+        self.assertIsNone(sudoku.grid_to_str(False))
+
+    def test_clue_eliminator(self):
+        # Generated code leaves the grid as eliminating each empty cell from
+        # the clues alone would
+        with open('data/evil_10_sudoku.txt', 'r') as input_handler:
+            lines = input_handler.readlines()
+
+        for puzzle in lines:
+            puzzle = puzzle.strip()
+            grid = sudoku.str_to_grid(puzzle, fill_possibilities=True)
+            clues = tuple(ndx for ndx, s in enumerate(puzzle) if s != '.')
+            expected = [sudoku.eliminate(grid, cell) or grid[cell]
+                        for cell in range(0, 81)]
+            self.assertEqual(expected,
+                             sudoku.make_clue_eliminator(clues)(grid[:]))
+
+    def test_solve_timed_all(self):
+        # Relabelled copies share clue positions, so they are solved with a
+        # clue eliminator. Results must match solving them one by one
+        with open('data/easy_10_sudoku.txt', 'r') as input_handler:
+            lines = [line.strip() for line in input_handler.readlines()]
+
+        puzzles = []
+        for puzzle in lines:
+            puzzles.append(puzzle)
+            puzzles.append(''.join(str(10-int(s)) if s in '123456789' else s
+                                   for s in puzzle))
+
+        for puzzle, (solution, _, depth) in zip(
+                puzzles, sudoku.solve_timed_all(puzzles)):
+            expected_sol, _, expected_depth = sudoku.solve_timed(puzzle)
+            self.assertEqual(expected_sol, solution)
+            self.assertEqual(expected_depth, depth)
+
+    def test_naked_pairs(self):
+        # Cells 0 and 1 of row 1 can only be 2 or 6, so no other cell is
+        pair = digits_mask('26')
+        grid = [sudoku.ALL_DIGITS] * 81
+        grid[0] = grid[1] = pair
+        grid[2] = digits_mask('267')
+        self.assertEqual(list(range(2, 9)),
+                         sudoku.eliminate_naked_pairs(grid, sudoku.rows[0]))
+        self.assertEqual([pair, pair, digits_mask('7')], grid[:3])
+        self.assertEqual([sudoku.ALL_DIGITS & ~pair] * 6, grid[3:9])
+        # Other rows are left alone
+        self.assertEqual([sudoku.ALL_DIGITS] * 72, grid[9:])
+
+    def test_naked_pairs_three_cells(self):
+        # Three cells can't share two digits
+        grid = [sudoku.ALL_DIGITS] * 81
+        grid[0] = grid[4] = grid[8] = digits_mask('26')
+        self.assertFalse(sudoku.eliminate_naked_pairs(grid, sudoku.rows[0]))
+
+    def test_naked_pairs_empty_cell(self):
+        grid = [sudoku.ALL_DIGITS] * 81
+        grid[0] = grid[1] = digits_mask('26')
+        grid[2] = digits_mask('2')
+        self.assertFalse(sudoku.eliminate_naked_pairs(grid, sudoku.rows[0]))
+
+    def test_naked_pairs_clash(self):
+        # Removing 2 and 6 leaves 7 for both cell 2 and cell 3
+        grid = [sudoku.ALL_DIGITS & ~digits_mask('267')] * 81
+        grid[0] = grid[1] = digits_mask('26')
+        grid[2] = digits_mask('27')
+        grid[3] = digits_mask('67')
+        self.assertFalse(sudoku.eliminate_naked_pairs(grid, sudoku.rows[0]))
+
+    def test_naked_pairs_unsolvable(self):
+        # Naked pairs used to solve two cells of a unit with the same digit
+        # and return an invalid solution for this puzzle
+        bad_input = '1437.568279.621543......71..1.5........1.6..83.......553.....61........4.........'
+        grid = sudoku.str_to_grid(bad_input, fill_possibilities=True)
+        self.assertFalse(sudoku.Solver().search(grid))
+        self.assertIsNone(sudoku.solve(bad_input))
+
+    def test_race(self):
+        good_input = '.1...8...3.472169...6....1....9.253..421.378..358.6....9....1...213874.9...5...2.'
+        expected_sol = '719638254354721698286495317678942531942153786135876942893264175521387469467519823'
+        solution, _, _ = sudoku.solve_race(good_input, 2)
+        self.assertEqual(expected_sol, solution)
+
+    def test_race_many(self):
+        # Workers of an easy puzzle finish at almost the same time. Stopping
+        # the losers used to hang now and then, so race many times
+        good_input = '.1...8...3.472169...6....1....9.253..421.378..358.6....9....1...213874.9...5...2.'
+        expected_sol = '719638254354721698286495317678942531942153786135876942893264175521387469467519823'
+        for _ in range(100):
+            solution, _, _ = sudoku.solve_race(good_input, 4)
+            self.assertEqual(expected_sol, solution)
+
     def test_blank_sudoku(self):
         # Blank sudoku will have 81 '.'
         sol = sudoku.solve(''.join('.' for x in range(0,81)))
@@ -37,37 +155,37 @@ class SudokuTest(unittest.TestCase):
 
     def test_contradicting_row(self):
         # Test for invalid input where a number appears more than once in any sudoku row
-        self.assertRaisesRegexp(InvalidSudokuError, '1 appears 2x in row 1',\
+        self.assertRaisesRegex(InvalidSudokuError, '1 appears 2x in row 1',\
                                 sudoku.solve,
                                 '1..1.............................................................................')
-        self.assertRaisesRegexp(InvalidSudokuError, '1 appears 2x in row 9',\
+        self.assertRaisesRegex(InvalidSudokuError, '1 appears 2x in row 9',\
                                 sudoku.solve,
                                 '...............................................................................11')
-        self.assertRaisesRegexp(InvalidSudokuError, '1 appears 2x in row 8',\
+        self.assertRaisesRegex(InvalidSudokuError, '1 appears 2x in row 8',\
                                 sudoku.solve,
                                 '...............................................................1.......1.........')  
 
     def test_contradicting_col(self):
         # Test for invalid input where a number appears more than once in any sudoku col
-        self.assertRaisesRegexp(InvalidSudokuError, '1 appears 2x in col 1',\
+        self.assertRaisesRegex(InvalidSudokuError, '1 appears 2x in col 1',\
                                 sudoku.solve,
                                 '1........1.......................................................................')
-        self.assertRaisesRegexp(InvalidSudokuError, '1 appears 2x in col 1',\
+        self.assertRaisesRegex(InvalidSudokuError, '1 appears 2x in col 1',\
                                 sudoku.solve,
                                 '1.......................................................................1........')
-        self.assertRaisesRegexp(InvalidSudokuError, '1 appears 2x in col 9',\
+        self.assertRaisesRegex(InvalidSudokuError, '1 appears 2x in col 9',\
                                 sudoku.solve,
                                 '........1.......................................................................1')
 
     def test_contradicting_sq(self):
         # Test for invalid input where a number appears more than once in any sudoku sq
-        self.assertRaisesRegexp(InvalidSudokuError, '9 appears 2x in a square',\
+        self.assertRaisesRegex(InvalidSudokuError, '9 appears 2x in a square',\
                                 sudoku.solve,
                                 '9.........9......................................................................')
-        self.assertRaisesRegexp(InvalidSudokuError, '9 appears 2x in a square',\
+        self.assertRaisesRegex(InvalidSudokuError, '9 appears 2x in a square',\
                                 sudoku.solve,
                                 '.....................................................................9..........9')
-        self.assertRaisesRegexp(InvalidSudokuError, '9 appears 2x in a square',\
+        self.assertRaisesRegex(InvalidSudokuError, '9 appears 2x in a square',\
                                 sudoku.solve,
                                 '..............................9...................9..............................')
 
@@ -78,7 +196,7 @@ class SudokuTest(unittest.TestCase):
 
     def test_easy_cases(self):
         lines = []
-        with open('data/easy_10_sudoku.txt', 'rb') as input_handler:
+        with open('data/easy_10_sudoku.txt', 'r') as input_handler:
             lines = input_handler.readlines()
 
         for puzzle in lines:
@@ -87,12 +205,47 @@ class SudokuTest(unittest.TestCase):
 
     def test_evil_cases(self):
         lines = []
-        with open('data/evil_10_sudoku.txt', 'rb') as input_handler:
+        with open('data/evil_10_sudoku.txt', 'r') as input_handler:
             lines = input_handler.readlines()
 
         for puzzle in lines:
             puzzle = puzzle.strip()
             self.assertTrue( sudoku.is_solved(sudoku.solve(puzzle)))
 
+
+class SolverCoreTests(object):
+    # Tests shared by the compiled solver cores. solver is the module with
+    # the core's solve() function
+    solver = None
+
+    def test_eq_81_char(self):
+        good_input = '.1...8...3.472169...6....1....9.253..421.378..358.6....9....1...213874.9...5...2.'
+        expected_sol = '719638254354721698286495317678942531942153786135876942893264175521387469467519823'
+        self.assertEqual(expected_sol, self.solver.solve(good_input))
+
+    def test_contradicting_row(self):
+        self.assertRaisesRegex(InvalidSudokuError, '1 appears 2x in row 1',\
+                                self.solver.solve,
+                                '1..1.............................................................................')
+
+    def test_evil_cases(self):
+        lines = []
+        with open('data/evil_10_sudoku.txt', 'r') as input_handler:
+            lines = input_handler.readlines()
+
+        for puzzle in lines:
+            puzzle = puzzle.strip()
+            self.assertTrue(sudoku.is_solved(self.solver.solve(puzzle)))
+
+
+@unittest.skipIf(solver_nb is None, 'numba is not installed')
+class NumbaSolverTest(SolverCoreTests, SudokuTestCase):
+    solver = solver_nb
+
+
+@unittest.skipIf(solver_c is None, 'solver_c extension is not built')
+class CythonSolverTest(SolverCoreTests, SudokuTestCase):
+    solver = solver_c
+
 if __name__ == '__main__':
     unittest.main()